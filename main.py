@@ -1,12 +1,85 @@
-import os, json, requests, re, time
+import os, json, requests, re, time, hashlib, email.utils
+import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
 from difflib import SequenceMatcher
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    import orjson  # optional: faster JSON; stdlib json is used when missing
+except ImportError:
+    orjson = None
+try:
+    from rapidfuzz import fuzz  # optional: C++ title similarity; difflib is used when missing
+except ImportError:
+    fuzz = None
 
 # --- ENV ---
 OPENAI_API_KEY     = os.environ["OPENAI_API_KEY"]
 TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
 TELEGRAM_CHAT_ID   = os.environ["TELEGRAM_CHAT_ID"]
 NEWSAPI_KEY        = os.environ.get("NEWSAPI_KEY", "")  # optional
+CACHE_DIR          = Path(os.environ.get("CACHE_DIR", ".cache"))
+LLM_CACHE_TTL      = int(os.environ.get("LLM_CACHE_TTL", "86400"))  # seconds; 0 disables the brief cache
+NEWSAPI_CACHE_TTL  = int(os.environ.get("NEWSAPI_CACHE_TTL", "86400"))  # seconds; 0 disables the NewsAPI cache
+
+# --- HTTP ---
+# One pooled keep-alive session for every outbound call, so repeated requests to the
+# same host reuse the TCP+TLS connection. Retry only covers idempotent methods (GET),
+# so a failed Telegram/OpenAI POST is never sent twice.
+SESSION = requests.Session()
+SESSION.headers["Connection"] = "keep-alive"
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)),
+))
+
+# --- JSON ---
+def json_dumps(obj) -> str:
+    """Compact JSON, non-ASCII kept as-is; same text from orjson or stdlib."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass  # e.g. a lone surrogate that json_loads let through; stdlib keeps it
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def json_loads(data):
+    """Parse with orjson when available; stdlib json is the fallback for what orjson rejects
+    (e.g. a lone surrogate escape left behind when an API cuts a field mid-emoji)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+# --- DISK CACHE ---
+def cache_key(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8", "surrogatepass")).hexdigest()
+
+def cache_read(path: Path, ttl: int):
+    """Return the cached text if the file exists and is younger than ttl seconds, else None."""
+    try:
+        if ttl > 0 and time.time() - path.stat().st_mtime <= ttl:
+            return path.read_text(encoding="utf-8")
+    except OSError:
+        pass
+    return None
+
+def cache_write(path: Path, text: str):
+    """Write via tmp file + rename so a crashed run never leaves a half-written entry."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
 
 # --- COMPANIES & PATTERNS ---
 COMPANY_PATTERNS = {
@@ -21,6 +94,11 @@ COMPANY_PATTERNS = {
     "Gojek":   [r"\bgojek\b", r"\bgo-jek\b"],
 }
 COMPANIES = list(COMPANY_PATTERNS.keys())
+# One alternation with a named group per company: a single scan tags every company
+COMPANY_RE = re.compile(
+    "|".join(f"(?P<{cname}>{'|'.join(patterns)})" for cname, patterns in COMPANY_PATTERNS.items()),
+    re.I,
+)
 
 # Aggregators are allowed, but we prefer original outlets when de-duping
 AGGREGATOR_DOMAINS = {
@@ -28,12 +106,10 @@ AGGREGATOR_DOMAINS = {
 }
 
 # --- TIME / COVERAGE ---
+HELSINKI_TZ = ZoneInfo("Europe/Helsinki")
+
 def helsinki_now():
-    try:
-        from zoneinfo import ZoneInfo
-        return datetime.now(ZoneInfo("Europe/Helsinki"))
-    except Exception:
-        return datetime.utcnow().replace(tzinfo=timezone.utc) + timedelta(hours=3)
+    return datetime.now(HELSINKI_TZ)
 
 def last_full_week_mon_sun(now_local: datetime):
     today = now_local.date()
@@ -45,6 +121,11 @@ def last_full_week_mon_sun(now_local: datetime):
 def to_display(d): return d.strftime("%d/%m/%Y")
 def to_iso(d):     return d.strftime("%Y-%m-%d")
 
+# --- URL ---
+def canon_url(url):
+    # Drop the query string and trailing slashes; partition avoids building a split list
+    return (url or "").partition("?")[0].rstrip("/")
+
 # --- FETCH: NewsAPI (multilingual; if key present) ---
 def fetch_news(from_iso: str, to_iso: str):
     if not NEWSAPI_KEY:
@@ -68,17 +149,31 @@ def fetch_news(from_iso: str, to_iso: str):
         "pageSize": 100,
         # no "language": allow multi-lingual
     }
-    headers = {"X-Api-Key": NEWSAPI_KEY}
-    r = requests.get(url, params=params, headers=headers, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+    # The coverage window is a closed past week: a re-run for the same (q, from, to)
+    # reads the stored response instead of calling NewsAPI again
+    cache_path = CACHE_DIR / "newsapi" / f"{cache_key(params)}.json"
+    body = cache_read(cache_path, NEWSAPI_CACHE_TTL)
+    if body is not None:
+        data = json_loads(body)
+    else:
+        headers = {"X-Api-Key": NEWSAPI_KEY}
+        r = SESSION.get(url, params=params, headers=headers, timeout=30)
+        r.raise_for_status()
+        data = json_loads(r.text)
+        # Stored only once it parses, so a bad body is never replayed from the cache
+        cache_write(cache_path, r.text)
     arts = data.get("articles", [])
-    out = []
+    # Results already come sorted by publishedAt and capped by pageSize, so one pass suffices;
+    # syndicated copies of the same URL are skipped before any dict is built
+    out, seen = [], set()
     for a in arts:
-        url_ = (a.get("url") or "").split("?")[0].rstrip("/")
+        url_ = canon_url(a.get("url"))
+        if not url_ or url_ in seen:
+            continue
         title = (a.get("title") or "").strip()
-        if not url_ or not title:
+        if not title:
             continue
+        seen.add(url_)
         out.append({
             "title": title,
             "source": (a.get("source") or {}).get("name"),
@@ -88,72 +183,138 @@ def fetch_news(from_iso: str, to_iso: str):
         })
     return out
 
-# --- FETCH: Google News RSS (no key; requires feedparser) ---
-def fetch_google_news_rss(from_dt_utc, to_dt_utc):
+# --- FETCH: Google News RSS (no key) ---
+RSS_FEED_CHUNK = 64 * 1024
+
+def parse_rss_items(body):
+    """
+    Return (link, title, pubDate, source) for each <item> of an RSS 2.0 body.
+    The body (bytes, or text from the feed cache) is fed to ElementTree's pull parser
+    in 64 KiB slices; finished <item>s are read and cleared after every slice, so at
+    most one slice's worth of items is ever built as a tree.
+    Unparseable bodies give [] (items read before the error are kept).
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    items = []
+
+    def drain():
+        for _, elem in parser.read_events():
+            if elem.tag == "item":
+                items.append((elem.findtext("link"), elem.findtext("title"),
+                              elem.findtext("pubDate"), elem.findtext("source")))
+                elem.clear()
+
     try:
-        import feedparser  # type: ignore
-    except Exception:
-        return []
-    results = []
-    # SEA/Africa/EU/LatAm/India
-    locales = [
+        for start in range(0, len(body), RSS_FEED_CHUNK):
+            parser.feed(body[start:start + RSS_FEED_CHUNK])
+            drain()
+        parser.close()
+    except ET.ParseError:
+        pass
+    drain()
+    return items
+
+# SEA/Africa/EU/LatAm/India: (hl, gl, ceid language)
+RSS_LOCALES = [
+    (hl, gl, hl.split("-")[-1]) for hl, gl in [
         ("en-SG", "SG"), ("en-ID", "ID"), ("en-GB", "GB"), ("en-IN", "IN"),
         ("en-ZA", "ZA"), ("en-KE", "KE"), ("en-NG", "NG"),
         ("es-ES", "ES"), ("es-MX", "MX"), ("es-CO", "CO"),
         ("pt-BR", "BR"), ("fr-FR", "FR"), ("fr-MA", "MA"),
         ("ru-RU", "RU"),
     ]
-    base = "https://news.google.com/rss/search?q={query}%20when:7d&hl={hl}&gl={gl}&ceid={gl}:{hl_code}"
-
-    company_queries = [
-        '"Uber" OR "Uber Technologies"',
-        '"Didi Chuxing" OR "DiDi" OR 滴滴 OR "99 App" OR "99"',
-        '"Bolt" OR "Taxify"',
-        '"inDrive" OR "inDriver"',
-        '"Cabify"',
-        '"Yassir"',
-        '"Heetch"',
-        '"Grab"',
-        '"Gojek" OR "Go-Jek"',
-    ]
+]
 
-    for q in company_queries:
-        q_enc = requests.utils.quote(q)
-        for hl, gl in locales:
-            hl_code = hl.split("-")[-1]
-            url = base.format(query=q_enc, hl=hl, gl=gl, hl_code=hl_code)
-            feed = feedparser.parse(url)
-            for e in feed.entries:
-                pub = None
-                if getattr(e, "published_parsed", None):
-                    pub = datetime(*e.published_parsed[:6], tzinfo=timezone.utc)
-                elif getattr(e, "updated_parsed", None):
-                    pub = datetime(*e.updated_parsed[:6], tzinfo=timezone.utc)
-                if not pub:
-                    continue
-                if not (from_dt_utc <= pub <= to_dt_utc + timedelta(days=1)):
-                    continue
-                link = (getattr(e, "link", "") or "").split("?")[0].rstrip("/")
-                title = (getattr(e, "title", "") or "").strip()
-                if not link or not title:
-                    continue
-                src = None
-                src_tag = getattr(e, "source", None)
-                if src_tag and hasattr(src_tag, "title"):
-                    src = src_tag.title
-                if not src:
-                    try:
-                        src = link.split("/")[2]
-                    except Exception:
-                        src = "Source"
-                results.append({
-                    "title": title,
-                    "source": src,
-                    "published_at": pub.isoformat(),
-                    "url": link,
-                    "description": "",
-                })
-            time.sleep(0.1)
+RSS_QUERIES = [
+    '"Uber" OR "Uber Technologies"',
+    '"Didi Chuxing" OR "DiDi" OR 滴滴 OR "99 App" OR "99"',
+    '"Bolt" OR "Taxify"',
+    '"inDrive" OR "inDriver"',
+    '"Cabify"',
+    '"Yassir"',
+    '"Heetch"',
+    '"Grab"',
+    '"Gojek" OR "Go-Jek"',
+]
+
+# Every query x locale feed, built once at import
+RSS_FEED_URLS = [
+    f"https://news.google.com/rss/search?q={q_enc}%20when:7d&hl={hl}&gl={gl}&ceid={gl}:{lang}"
+    for q_enc in map(quote, RSS_QUERIES)
+    for hl, gl, lang in RSS_LOCALES
+]
+
+def fetch_google_news_rss(from_dt_utc, to_dt_utc):
+    results = []
+    urls = RSS_FEED_URLS
+
+    # Conditional GET: url -> {etag, last_modified, body}; a 304 reuses the stored body
+    cache_path = CACHE_DIR / "rss.json"
+    try:
+        rss_cache = json_loads(cache_path.read_bytes())
+    except (OSError, ValueError):
+        rss_cache = {}
+
+    def fetch_feed(url):
+        # Fetch over the shared session, parse the body; a failed feed is just empty
+        cached = rss_cache.get(url) or {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            r = SESSION.get(url, headers=headers, timeout=20)
+            r.raise_for_status()
+        except Exception:
+            return []
+        if r.status_code == 304 and "body" in cached:
+            body = cached["body"]
+        else:
+            # Raw bytes: the parser honours the XML encoding declaration itself
+            body = r.content
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            if etag or last_modified:
+                rss_cache[url] = {"etag": etag, "last_modified": last_modified, "body": r.text}
+        return parse_rss_items(body)
+
+    # All feeds are independent and I/O bound: fan out instead of fetching one by one
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        feeds = list(ex.map(fetch_feed, urls))
+
+    # Keep only this run's feeds so the file does not grow with retired queries/locales
+    cache_write(cache_path, json_dumps({u: rss_cache[u] for u in urls if u in rss_cache}))
+
+    # Window check on epoch ints; a datetime is only built for entries that pass
+    from_ts = int(from_dt_utc.timestamp())
+    to_ts   = int(to_dt_utc.timestamp()) + 86400
+    # Queries/locales overlap heavily: drop repeat links before extracting any other field
+    seen = set()
+    for items in feeds:
+        for link, title, pub_date, src in items:
+            link = canon_url(link)
+            if not link or link in seen:
+                continue
+            parsed = email.utils.parsedate_tz(pub_date) if pub_date else None
+            if not parsed:
+                continue
+            ts = email.utils.mktime_tz(parsed)
+            if not (from_ts <= ts <= to_ts):
+                continue
+            title = (title or "").strip()
+            if not title:
+                continue
+            seen.add(link)
+            src = (src or "").strip()
+            if not src:
+                src = domain_of(link) or "Source"
+            results.append({
+                "title": title,
+                "source": src,
+                "published_at": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "url": link,
+                "description": "",
+            })
     return results
 
 # --- CLASSIFY & FILTER ---
@@ -182,20 +343,23 @@ COMMERCIAL_WHITELIST = [
 ]
 
 def text_of(a):
-    return f"{a.get('title','')} {a.get('description','')} {a.get('url','')}".lower()
+    # Memoized on the article: relevance filtering and company tagging both scan it
+    t = a.get("_text")
+    if t is None:
+        t = a["_text"] = f"{a.get('title','')} {a.get('description','')} {a.get('url','')}".lower()
+    return t
 
 def has_any(text, keywords):
     return any(k in text for k in keywords)
 
 def tag_companies(a):
     txt = text_of(a)
-    tags = []
-    for cname, patterns in COMPANY_PATTERNS.items():
-        for pat in patterns:
-            if re.search(pat, txt, flags=re.I):
-                tags.append(cname)
-                break
-    return tags
+    found = set()
+    for m in COMPANY_RE.finditer(txt):
+        found.add(m.lastgroup)
+        if len(found) == len(COMPANIES):
+            break
+    return [c for c in COMPANIES if c in found]  # keep COMPANY_PATTERNS order
 
 def is_business_relevant(a):
     t = text_of(a)
@@ -208,80 +372,121 @@ def is_business_relevant(a):
     return True
 
 def domain_of(url):
+    # hostname drops userinfo/port and is already lowercased
     try:
-        return url.split("/")[2].lower()
-    except Exception:
+        return urlsplit(url).hostname or ""
+    except ValueError:
         return ""
 
+NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+# ASCII punctuation/symbols -> space; same effect as NON_ALNUM_RE.sub(" ", s) on ASCII text
+NORM_ASCII_TABLE = str.maketrans({
+    c: " " for c in map(chr, range(128)) if not (c.isdigit() or "a" <= c <= "z" or c.isspace())
+})
+
 def norm_title(s):
     s = s.lower()
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    if s.isascii():
+        s = s.translate(NORM_ASCII_TABLE)
+    else:
+        s = NON_ALNUM_RE.sub(" ", s)
+    return " ".join(s.split())
 
-def similar(a, b, threshold=0.80):
-    return SequenceMatcher(None, a, b).ratio() >= threshold
+def title_matcher(b):
+    """
+    Return match(a, threshold): True if the 0..1 similarity ratio of title a against
+    title b is >= threshold. The ratio is rapidfuzz's Indel ratio when installed,
+    otherwise difflib's ratio() from one SequenceMatcher kept per b (it indexes its
+    second sequence once, so only the first is swapped per call).
+    """
+    if fuzz is not None:
+        # Indel ratio: same 0..1 scale as difflib's, never lower (LCS >= matched blocks).
+        # score_cutoff lets rapidfuzz bail out early (it returns 0 below the cutoff).
+        def match(a, threshold):
+            cutoff = threshold * 100
+            return a == b or fuzz.ratio(a, b, score_cutoff=cutoff) >= cutoff
+        return match
+
+    # autojunk would treat frequent chars in titles >= 200 chars as junk and skew the ratio
+    sm = SequenceMatcher(None, "", b, autojunk=False)
+    def match(a, threshold):
+        if a == b:
+            return True
+        sm.set_seq1(a)
+        # real_quick_ratio/quick_ratio are cheap upper bounds of ratio(): reject before the O(n*m) match
+        return (sm.real_quick_ratio() >= threshold
+                and sm.quick_ratio() >= threshold
+                and sm.ratio() >= threshold)
+    return match
 
 def merge_dedupe_with_similarity(articles):
+    # Generator: yields each kept article as soon as it is known to be unique, so a
+    # consumer that stops early (limit_per_company once all caps are hit) skips the rest.
     # Prefer non-aggregators first, then newest-ish order (we don't enforce strict date sort here)
-    non_agg = [a for a in articles if domain_of(a.get("url","")) not in AGGREGATOR_DOMAINS]
-    agg     = [a for a in articles if domain_of(a.get("url","")) in AGGREGATOR_DOMAINS]
+    # (articles carry precomputed "_domain"/"_tnorm", see fetch_articles)
+    non_agg, agg = [], []
+    for a in articles:
+        (agg if a["_domain"] in AGGREGATOR_DOMAINS else non_agg).append(a)
     ordered = non_agg + agg
 
-    kept = []
+    kept_keys = []  # (domain, title matcher) per kept article
+    kept_urls, kept_tnorms = set(), set()
     for a in ordered:
-        url = (a.get("url") or "").split("?")[0].rstrip("/")
-        title = (a.get("title") or "").strip()
-        tnorm = norm_title(title)
-
-        # Drop if essentially duplicate of a kept item (by URL or by similar title)
-        dup = False
-        for b in kept:
-            burl = (b.get("url") or "").split("?")[0].rstrip("/")
-            btitle = (b.get("title") or "").strip()
-            btnorm = norm_title(btitle)
-            # Same-domain near-duplicate (looser threshold)
-            if domain_of(url) == domain_of(burl) and similar(tnorm, btnorm, 0.75):
-                dup = True; break
-            # Cross-domain near-duplicate
-            if similar(tnorm, btnorm, 0.85):
-                dup = True; break
-        if dup:
+        domain, tnorm = a["_domain"], a["_tnorm"]
+
+        # Exact repeats (same URL, or same normalized title) are dropped by hash lookup
+        # before any pairwise comparison; an equal title would match at any threshold anyway
+        if a["url"] in kept_urls or tnorm in kept_tnorms:
+            continue
+
+        # Drop if essentially duplicate of a kept item (by similar title).
+        # Same-domain near-duplicates use the looser 0.75 threshold, cross-domain 0.85;
+        # one check per pair suffices since failing 0.75 implies failing 0.85.
+        if any(match(tnorm, 0.75 if domain == bdomain else 0.85) for bdomain, match in kept_keys):
             continue
 
-        kept.append(a)
-    return kept
+        kept_keys.append((domain, title_matcher(tnorm)))
+        kept_urls.add(a["url"])
+        kept_tnorms.add(tnorm)
+        yield a
 
 def limit_per_company(articles, max_per=7):
     counts = {c: 0 for c in COMPANIES}
+    full = set()  # companies that reached max_per
     selected = []
     for a in articles:
         tags = a.get("companies") or []
         if not tags:
             # drop items without a known company tag to avoid model guessing
             continue
-        if any(counts.get(c, 0) >= max_per for c in tags):
+        if any(c in full for c in tags):
             continue
         for c in tags:
             if c in counts:
                 counts[c] += 1
+                if counts[c] >= max_per:
+                    full.add(c)
         selected.append(a)
+        # every company is capped and untagged items are dropped anyway: nothing else can pass
+        if len(full) == len(COMPANIES):
+            break
     return selected
 
 def fetch_articles(from_iso: str, to_iso: str):
+    from_dt_utc = datetime.fromisoformat(from_iso + "T00:00:00+00:00")
+    to_dt_utc   = datetime.fromisoformat(to_iso   + "T23:59:59+00:00")
+
+    # NewsAPI and RSS hit disjoint hosts: run both at once so we wait max(), not sum()
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_news = ex.submit(fetch_news, from_iso, to_iso)
+        f_rss  = ex.submit(fetch_google_news_rss, from_dt_utc, to_dt_utc)  # RSS fallback
+
     arts = []
-    # NewsAPI
-    try:
-        arts += fetch_news(from_iso, to_iso)
-    except Exception:
-        pass
-    # RSS fallback
-    try:
-        from_dt_utc = datetime.fromisoformat(from_iso + "T00:00:00+00:00")
-        to_dt_utc   = datetime.fromisoformat(to_iso   + "T23:59:59+00:00")
-        arts += fetch_google_news_rss(from_dt_utc, to_dt_utc)
-    except Exception:
-        pass
+    for f in (f_news, f_rss):
+        try:
+            arts += f.result()
+        except Exception:
+            pass
 
     # Filter business relevance & tag companies
     filtered = []
@@ -289,109 +494,78 @@ def fetch_articles(from_iso: str, to_iso: str):
         if not is_business_relevant(a):
             continue
         a["companies"] = tag_companies(a)
+        # Computed once here, read by merge_dedupe_with_similarity for every pair
+        a["_domain"] = domain_of(a.get("url") or "")
+        a["_tnorm"]  = norm_title((a.get("title") or "").strip())
         filtered.append(a)
 
-    # Stronger de-dup
-    filtered = merge_dedupe_with_similarity(filtered)
-
-    # Enforce per-company cap BEFORE model
-    capped = limit_per_company(filtered, max_per=7)
+    # Stronger de-dup, consumed lazily by the per-company cap (enforced BEFORE model):
+    # once every company is full, the remaining similarity checks never run
+    capped = limit_per_company(merge_dedupe_with_similarity(filtered), max_per=7)
 
     # Protect tokens
     return capped[:120]
 
 # --- OUTPUT POST-PROCESS (extra safety) ---
 ANCHOR_RE = re.compile(r'<a href="([^"]+)">', re.IGNORECASE)
+BULLET_LINE_RE = re.compile(r'^\s*➡️ \s*\S')  # same test as ln.strip().startswith("➡️ "), no copy
+BULLET_ANCHOR_RE = re.compile(r'(<a href="[^"]+">)(.+?)(</a>)(\s+—\s+.+)$')
 
-def fix_bullet_prefixes(text: str) -> str:
-    # Replace any leading "- ➡️" with "➡️ "
-    lines = text.splitlines()
-    for i, ln in enumerate(lines):
-        s = ln.lstrip()
-        if s.startswith("- ➡️"):
-            # keep original left-space indentation minimal; produce canonical
-            lines[i] = "➡️ " + s[len("- ➡️"):].lstrip()
-    return "\n".join(lines)
-
-def dedupe_output_bullets(text: str) -> str:
-    lines = text.splitlines()
-    out, seen_urls = [], set()
-    for ln in lines:
-        s = ln.strip()
-        if s.startswith("➡️"):
-            m = ANCHOR_RE.search(s)
-            if m:
-                url = m.group(1)
-                if url in seen_urls:
-                    continue
-                seen_urls.add(url)
-        out.append(ln)
-    return "\n".join(out)
-
-def enforce_output_company_cap(text: str, max_per=7) -> str:
+def clean_brief(text: str, max_per=7) -> str:
     """
-    Inside the Top 15 block, ensure no company exceeds cap.
-    We detect company tags at the end of the line: " — Source — Company[/Company]"
-    Excess bullets (beyond cap) are dropped from the end-first.
+    Output safeties in one pass over the lines, applied to each line in order:
+    1) Canonical bullet prefix: a leading "- ➡️" becomes "➡️ ".
+    2) Drop bullets whose link URL already appeared in an earlier bullet.
+    3) Inside the Top 15 block, drop bullets whose company tag (" — Source — Company[/Company]")
+       is unknown, or that would push a company past max_per (later bullets go first).
+    4) Drop bullets that look like incidents or generic studies.
+    A bullet dropped by a later step still counts for the earlier ones (seen URL, cap).
     """
-    lines = text.splitlines()
-    # locate Top block by headers/separators
-    try:
-        top_idx = next(i for i, ln in enumerate(lines) if ln.strip().startswith("<b>📌 Top"))
-    except StopIteration:
-        return text
-    try:
-        # Top block ends at next separator "––––" or Trend header
-        end_idx = next(i for i, ln in enumerate(lines[top_idx+1:], start=top_idx+1)
-                       if ln.strip() == "––––" or ln.strip().startswith("<b>📌 Trend"))
-    except StopIteration:
-        end_idx = len(lines)
-
+    out, seen_urls = [], set()
     company_counts = {c: 0 for c in COMPANIES}
-    new_section = []
-    for i in range(top_idx+1, end_idx):
-        ln = lines[i]
+    top_state = 0  # 0 = before the Top header, 1 = inside the Top block, 2 = after it
+    for ln in text.splitlines():
+        if ln.lstrip().startswith("- ➡️"):
+            ln = "➡️ " + ln.lstrip()[len("- ➡️"):].lstrip()
         s = ln.strip()
+
         if not s.startswith("➡️"):
-            new_section.append(ln)
+            # Top block runs from the first Top header to the next separator or Trend header
+            if top_state == 0 and s.startswith("<b>📌 Top"):
+                top_state = 1
+            elif top_state == 1 and (s == "––––" or s.startswith("<b>📌 Trend")):
+                top_state = 2
+            out.append(ln)
             continue
-        # extract company label after last " — "
-        parts = s.split(" — ")
-        if len(parts) < 3:
-            # malformed; keep but don't count
-            new_section.append(ln)
-            continue
-        comp_field = parts[-1]
-        comps = [c.strip() for c in comp_field.split("/") if c.strip()]
-        # If company unknown, drop (avoid guessing)
-        if not any(c in COMPANIES for c in comps):
-            continue
-        # Enforce caps
-        over = any(company_counts.get(c, 0) >= max_per for c in comps if c in COMPANIES)
-        if over:
-            continue
-        for c in comps:
-            if c in company_counts:
-                company_counts[c] += 1
-        new_section.append(ln)
-
-    # rebuild text
-    rebuilt = lines[:top_idx+1] + new_section + lines[end_idx:]
-    return "\n".join(rebuilt)
 
-def filter_out_incident_and_study_bullets(text: str) -> str:
-    """Extra safety on final text: drop bullets that look like incidents or generic studies."""
-    lines = text.splitlines()
-    out = []
-    for ln in lines:
-        s = ln.strip().lower()
-        if s.startswith("➡️"):
-            # incident filter
-            if any(k in s for k in INCIDENT_BLACKLIST):
-                continue
-            # study/report filter unless commercial whitelist present
-            if any(k in s for k in STUDY_REPORT_TERMS) and not any(k in s for k in COMMERCIAL_WHITELIST):
+        m = ANCHOR_RE.search(s)
+        if m:
+            url = m.group(1)
+            if url in seen_urls:
                 continue
+            seen_urls.add(url)
+
+        if top_state == 1:
+            # extract company label after last " — "; malformed lines are kept but not counted
+            parts = s.split(" — ")
+            if len(parts) >= 3:
+                comps = [c.strip() for c in parts[-1].split("/") if c.strip()]
+                # If company unknown, drop (avoid guessing)
+                if not any(c in COMPANIES for c in comps):
+                    continue
+                if any(company_counts[c] >= max_per for c in comps if c in company_counts):
+                    continue
+                for c in comps:
+                    if c in company_counts:
+                        company_counts[c] += 1
+
+        low = s.lower()
+        # incident filter
+        if has_any(low, INCIDENT_BLACKLIST):
+            continue
+        # study/report filter unless commercial whitelist present
+        if has_any(low, STUDY_REPORT_TERMS) and not has_any(low, COMMERCIAL_WHITELIST):
+            continue
         out.append(ln)
     return "\n".join(out)
 
@@ -400,55 +574,80 @@ def truncate_to_one_message(text: str, hard_limit=4096):
     """
     Single Telegram message guarantee:
     1) If <= limit, return as is.
-    2) Shrink anchor headline text for bullets progressively.
+    2) Shrink bullet headlines to the longest cap (140, 130, ... 80 chars) that fits.
     3) If still long, drop bullets from the end.
     """
     if len(text) <= hard_limit:
         return text
 
     lines = text.splitlines()
-    bullet_idx = [i for i, ln in enumerate(lines) if ln.strip().startswith('➡️ ')]
-
-    def shrink_line(line, max_head_len):
-        m = re.search(r'(<a href="[^"]+">)(.+?)(</a>)(\s+—\s+.+)$', line)
-        if not m:
-            return line
-        pre, head, post, tail = m.groups()
+    bullet_idx = [i for i, ln in enumerate(lines) if BULLET_LINE_RE.match(ln)]
+    # Parse each bullet's anchor once; shrinking then rebuilds from the cached parts
+    anchors = {}
+    for i in bullet_idx:
+        m = BULLET_ANCHOR_RE.search(lines[i])
+        if m:
+            anchors[i] = (lines[i][:m.start()],) + m.groups()
+
+    def shrink_line(i, max_head_len):
+        lead, pre, head, post, tail = anchors[i]
         if len(head) <= max_head_len:
-            return line
-        head = head[:max_head_len].rstrip() + "…"
-        return pre + head + post + tail
-
-    max_len = 140
-    while len("\n".join(lines)) > hard_limit and max_len >= 80:
-        for i in bullet_idx:
-            lines[i] = shrink_line(lines[i], max_len)
-        max_len -= 10
-
-    while len("\n".join(lines)) > hard_limit and bullet_idx:
+            return lines[i]
+        return lead + pre + head[:max_head_len].rstrip() + "…" + post + tail
+
+    # Running length of "\n".join(lines), updated per edit instead of re-joining
+    total = sum(map(len, lines)) + len(lines) - 1
+
+    # Pick the longest headline cap (140, 130, ... 80) that fits. Total length only grows
+    # with the cap, so binary search over the steps instead of trying them one by one.
+    if total > hard_limit:
+        steps = range(140, 79, -10)
+        # Longest headline first: a cap only visits the bullets whose head exceeds it
+        by_head_len = sorted(anchors, key=lambda i: len(anchors[i][2]), reverse=True)
+
+        def over_cap(max_len):
+            for i in by_head_len:
+                if len(anchors[i][2]) <= max_len:
+                    break
+                yield i
+
+        def total_at(max_len):
+            return total + sum(len(shrink_line(i, max_len)) - len(lines[i]) for i in over_cap(max_len))
+
+        lo, hi, best = 0, len(steps) - 1, len(steps) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if total_at(steps[mid]) <= hard_limit:
+                best, hi = mid, mid - 1
+            else:
+                lo = mid + 1
+        for i in over_cap(steps[best]):
+            new = shrink_line(i, steps[best])
+            total += len(new) - len(lines[i])
+            lines[i] = new
+
+    while total > hard_limit and bullet_idx:
         drop_i = bullet_idx.pop()  # drop last bullet
-        lines.pop(drop_i)
+        total -= len(lines.pop(drop_i)) + 1
 
     return "\n".join(lines)
 
 # --- OPENAI ---
-def chatgpt_brief(coverage_end_disp, articles):
-    system = "You are a concise industry analyst for ride-hailing."
+# Static instructions live in one module-level constant sent first, so every weekly run
+# shares a byte-identical prompt prefix (OpenAI prompt caching matches on prefixes);
+# only the coverage date and the article JSON vary, and they come last.
+BRIEF_INSTRUCTIONS = """You are a concise industry analyst for ride-hailing.
 
-    user = f"""
 Generate a weekly competitor news brief for ride-hailing. Companies: Uber, DiDi (滴滴), Bolt, inDrive, Cabify, Yassir, Heetch, Grab, Gojek.
 
-Use ONLY the articles in the JSON array below. Do not invent links. Remove duplicates before writing.
+Use ONLY the articles in the JSON array given in the user message. Do not invent links. Remove duplicates before writing.
 Include only commercial/strategic items: launches, new cities/countries, expansion, partnerships, M&A, funding/financing, pricing/regulatory changes, product/feature rollouts, EV/AV/robotaxi.
 Exclude accidents, crimes, and personal incidents. Exclude generic studies/reports unless they announce a specific commercial/regulatory action.
 Use the provided "companies" tags for the Company label; do NOT guess. If an item has no company tag, skip it.
 
-ARTICLES (JSON array; each item may include a "companies" array with detected tags):
-{json.dumps(articles, ensure_ascii=False)}
-
-Output EXACTLY:
+Output EXACTLY (write the header line as shown, COVERAGE_END included; the date is filled in afterwards):
 
-<b>📌 Weekly Competitor Brief — {coverage_end_disp}</b>
+<b>📌 Weekly Competitor Brief — COVERAGE_END</b>
 ––––
 <b>📌 Top 15</b>
 - Select up to 15 important, unique items (aim for 15; fewer is OK if not enough credible items).
@@ -466,29 +665,103 @@ Rules:
 - Keep headlines one sentence and neutral.
 - Use the exact URLs from the JSON (no shortening or changing domains).
 - Output ONLY the sections above, in this order, with the same bold HTML headers and separators.
+"""
+
+# Header line of the brief; its date is always set in code, whatever the model wrote there
+BRIEF_HEADER_RE = re.compile(r"^\s*<b>📌 Weekly Competitor Brief\b[^\n]*$", re.MULTILINE)
+
+def set_brief_date(text, coverage_end_disp):
+    """Put the code-built header on the brief, replacing the model's header line or adding one."""
+    header = f"<b>📌 Weekly Competitor Brief — {coverage_end_disp}</b>"
+    text, n = BRIEF_HEADER_RE.subn(lambda m: header, text, count=1)
+    return text if n else header + "\n" + text.lstrip("\n")
+
+BRIEF_MAX_TOKENS = 2500
+
+def brief_token_budget(articles):
+    """
+    max_tokens sized from what the bullets will echo back: each one repeats its URL and
+    headline (Google News article IDs are base64 and tokenize poorly, so 2 chars/token
+    is assumed), plus markup, source and company. Budgeted on the 15 longest, capped at
+    BRIEF_MAX_TOKENS; the header and Trend Takeaway fit in the fixed 400.
+    """
+    per_bullet = sorted((len(a.get("url") or "") + len(a.get("title") or "") for a in articles), reverse=True)
+    return min(BRIEF_MAX_TOKENS, 400 + sum(n // 2 + 30 for n in per_bullet[:15]))
+
+def openai_complete(payload):
+    """POST a chat completion; return (content, finish_reason)."""
+    resp = SESSION.post(
+        "https://api.openai.com/v1/chat/completions",
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        json=payload, timeout=90
+    )
+    resp.raise_for_status()
+    choice = json_loads(resp.content)["choices"][0]
+    return choice["message"]["content"], choice.get("finish_reason")
+
+def chatgpt_brief(coverage_end_disp, articles):
+    # "_"-prefixed keys are internal caches; keep them out of the prompt (and the cache key).
+    # Descriptions are only context for a one-line bullet, so the lede is enough.
+    prompt_articles = []
+    for a in articles:
+        item = {k: v for k, v in a.items() if not k.startswith("_")}
+        desc = item.get("description") or ""
+        if len(desc) > 200:
+            item["description"] = desc[:200].rstrip() + "…"
+        prompt_articles.append(item)
+    user = f"""Coverage end: {coverage_end_disp}
+
+ARTICLES (JSON array; each item may include a "companies" array with detected tags):
+{json_dumps(prompt_articles)}
 """
     payload = {
         "model": "gpt-4o-mini",
         "messages": [
-            {"role": "system", "content": system},
+            {"role": "system", "content": BRIEF_INSTRUCTIONS},
             {"role": "user", "content": user}
         ],
         "temperature": 0.2,
-        "max_tokens": 2500,
+        "max_tokens": brief_token_budget(articles),
     }
-    resp = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
-        json=payload, timeout=90
+
+    # Re-runs over the same coverage window and article set reuse the stored completion.
+    # Only near-deterministic settings are cached; a hotter temperature should resample.
+    cache_path = None
+    if payload["temperature"] <= 0.2:
+        cache_path = CACHE_DIR / "brief" / f"{cache_key(payload)}.txt"
+        cached = cache_read(cache_path, LLM_CACHE_TTL)
+        if cached is not None:
+            return set_brief_date(cached, coverage_end_disp)
+
+    content, finish = openai_complete(payload)
+    # A completion cut off at max_tokens ends mid-anchor, which Telegram's HTML parser
+    # rejects: retry once with the full budget, and never send a truncated brief
+    if finish == "length" and payload["max_tokens"] < BRIEF_MAX_TOKENS:
+        content, finish = openai_complete({**payload, "max_tokens": BRIEF_MAX_TOKENS})
+    if finish == "length":
+        raise RuntimeError(f"Brief truncated at max_tokens={BRIEF_MAX_TOKENS}")
+    # Only a completion that ended on its own is worth replaying on the next run
+    if cache_path and finish == "stop":
+        cache_write(cache_path, content)
+    return set_brief_date(content, coverage_end_disp)
+
+def empty_brief(coverage_end_disp):
+    """Local stand-in for weeks with no candidate articles; same sections as a model brief."""
+    return (
+        f"<b>📌 Weekly Competitor Brief — {coverage_end_disp}</b>\n"
+        "––––\n"
+        "<b>📌 Top 15</b>\n"
+        "No qualifying competitor news found for this week.\n"
+        "––––\n"
+        "<b>📌 Trend Takeaway</b>\n"
+        "No trend to report."
     )
-    resp.raise_for_status()
-    return resp.json()["choices"][0]["message"]["content"]
 
 # --- TELEGRAM ---
 TG_API = "https://api.telegram.org/bot{token}/{method}"
 
 def tg_send_text_single(text: str):
-    r = requests.post(
+    r = SESSION.post(
         TG_API.format(token=TELEGRAM_BOT_TOKEN, method="sendMessage"),
         json={
             "chat_id": TELEGRAM_CHAT_ID,
@@ -510,14 +783,16 @@ def main():
     articles = fetch_articles(cov_start_iso, cov_end_iso)
     print(f"Coverage: {to_display(cov_start)} – {to_display(cov_end)} | Articles fetched (pre-model): {len(articles)}")
 
+    # Nothing to summarize: send the static brief instead of paying for a model call
+    if not articles:
+        tg_send_text_single(empty_brief(cov_end_disp))
+        return
+
     # Generate brief
     brief = chatgpt_brief(cov_end_disp, articles)
 
     # Output safeties
-    brief = fix_bullet_prefixes(brief)                 # ensure bullets use "➡️ " only
-    brief = dedupe_output_bullets(brief)               # remove duplicate URL bullets
-    brief = enforce_output_company_cap(brief, 7)       # enforce max 7 per company in final list
-    brief = filter_out_incident_and_study_bullets(brief)  # drop any stray incident/study bullets
+    brief = clean_brief(brief, 7)                      # bullet prefixes, URL dedupe, company cap, incident/study filter
     # (Model already asked to inline anchors; keep fallback just in case)
     brief = truncate_to_one_message(brief.strip())     # ensure single Telegram message
 